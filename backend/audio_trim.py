@@ -0,0 +1,118 @@
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+SAMPLE_RATE = 16000
+DEFAULT_FRAME_SECONDS = 0.03
+DEFAULT_MARGIN_DB = 12
+DEFAULT_MIN_SILENCE_SECONDS = 1.0
+DEFAULT_PAD_SECONDS = 0.25
+
+
+def frame_energy_db(audio, frame_samples):
+    n_frames = len(audio) // frame_samples
+    frames = audio[:n_frames * frame_samples].reshape(n_frames, frame_samples)
+    energy = np.square(frames, dtype=np.float32).mean(axis=1)
+    return 10 * np.log10(energy + 1e-10)
+
+
+def find_runs(mask):
+    # (start, end) frame indices of each run of True values, end exclusive
+    padded = np.concatenate(([False], mask, [False]))
+    edges = np.flatnonzero(np.diff(padded.astype(np.int8)))
+    return edges.reshape(-1, 2)
+
+
+def build_speech_timeline(audio, sample_rate=SAMPLE_RATE, frame_seconds=DEFAULT_FRAME_SECONDS,
+                          margin_db=DEFAULT_MARGIN_DB, min_silence_seconds=DEFAULT_MIN_SILENCE_SECONDS,
+                          pad_seconds=DEFAULT_PAD_SECONDS):
+    """Return the speech spans of `audio` as an (N, 2) array of [start, end) sample offsets.
+
+    A frame counts as speech when its energy is `margin_db` above the noise floor
+    (10th percentile of frame energies). Only pauses longer than `min_silence_seconds`
+    are cut and every span is padded so word onsets and tails are kept.
+    """
+    frame_samples = int(frame_seconds * sample_rate)
+    energy = frame_energy_db(audio, frame_samples)
+    if len(energy) == 0:
+        return np.array([[0, len(audio)]], dtype=np.int64)
+
+    noise_floor = np.percentile(energy, 10)
+    speech = energy > noise_floor + margin_db
+
+    # Close short pauses so only long stretches of silence are removed
+    min_silence_frames = int(min_silence_seconds / frame_seconds)
+    for start, end in find_runs(~speech):
+        if end - start < min_silence_frames and start > 0 and end < len(speech):
+            speech[start:end] = True
+
+    pad = int(pad_seconds * sample_rate)
+    spans = find_runs(speech) * frame_samples
+    if len(spans) == 0:
+        return np.array([[0, len(audio)]], dtype=np.int64)
+    spans[:, 0] = np.maximum(spans[:, 0] - pad, 0)
+    spans[:, 1] = np.minimum(spans[:, 1] + pad, len(audio))
+    # The last frame may be partial, keep the tail of the file when speech runs to the end
+    if spans[-1, 1] >= len(energy) * frame_samples:
+        spans[-1, 1] = len(audio)
+
+    # Padding can make neighbouring spans overlap, merge them
+    merged = [list(spans[0])]
+    for start, end in spans[1:]:
+        if start <= merged[-1][1]:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return np.array(merged, dtype=np.int64)
+
+
+def trim_audio(audio, sample_rate=SAMPLE_RATE, **kwargs):
+    """Keep only the speech spans of `audio`.
+
+    Returns the trimmed audio, a timeline for map_time/remap_segments and stats
+    with the fraction of audio skipped.
+    """
+    spans = build_speech_timeline(audio, sample_rate, **kwargs)
+    lengths = spans[:, 1] - spans[:, 0]
+    timeline = {
+        # Where each span starts in the trimmed audio and in the original, in seconds
+        "trimmed_starts": np.concatenate(([0], np.cumsum(lengths)[:-1])) / sample_rate,
+        "original_starts": spans[:, 0] / sample_rate,
+    }
+    trimmed = np.concatenate([audio[start:end] for start, end in spans])
+
+    original_seconds = len(audio) / sample_rate
+    trimmed_seconds = len(trimmed) / sample_rate
+    skipped = 1 - trimmed_seconds / original_seconds if original_seconds else 0.0
+    stats = {
+        "original_seconds": round(original_seconds, 2),
+        "trimmed_seconds": round(trimmed_seconds, 2),
+        "speech_spans": len(spans),
+        "skipped_fraction": round(skipped, 4),
+    }
+    logger.info(f"Trimmed audio from {original_seconds:.1f}s to {trimmed_seconds:.1f}s "
+                f"in {len(spans)} speech spans ({skipped:.1%} skipped)")
+    return trimmed, timeline, stats
+
+
+def map_time(seconds, timeline, side='right'):
+    """Map a time in the trimmed audio back to the original audio (scalar or array).
+
+    A time exactly on a join belongs to the following span with side='right' and to
+    the preceding one with side='left', which is what end timestamps want.
+    """
+    index = np.searchsorted(timeline["trimmed_starts"], seconds, side=side) - 1
+    index = np.clip(index, 0, len(timeline["trimmed_starts"]) - 1)
+    return timeline["original_starts"][index] + (seconds - timeline["trimmed_starts"][index])
+
+
+def remap_segments(segments, timeline):
+    """Rewrite segment and word timestamps in place from trimmed to original time."""
+    for segment in segments:
+        for item in [segment] + segment.get("words", []):
+            if "start" in item:
+                item["start"] = float(map_time(item["start"], timeline))
+            if "end" in item:
+                item["end"] = float(map_time(item["end"], timeline, side='left'))
+    return segments
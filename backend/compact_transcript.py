@@ -0,0 +1,158 @@
+import re
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Matches the lines produced by format_youtube_transcript and transcribe_audio:
+# [hh:mm:ss - hh:mm:ss] SPEAKER_00: text
+LINE_PATTERN = re.compile(r"^\[(\d{2}:\d{2}:\d{2}(?:\.\d+)?) - (\d{2}:\d{2}:\d{2}(?:\.\d+)?)\] ([^:]*): ?(.*)$")
+
+# Caption noise such as [Music], [Applause], [Laughter] and music note glyphs
+NON_SPEECH_PATTERN = re.compile(r"\[[^\]]*\]|[♪♫♬]+")
+# YouTube captions label every line SPEAKER_00 and mark speaker changes with ">>"
+SPEAKER_CHANGE_PATTERN = re.compile(r"&gt;&gt;|>>")
+WHITESPACE_PATTERN = re.compile(r"\s+")
+
+DEFAULT_MAX_PARAGRAPH_SECONDS = 60
+DEFAULT_MAX_GAP_SECONDS = 5
+MIN_OVERLAP_WORDS = 2
+
+
+def parse_timestamp(timestamp):
+    hours, minutes, seconds = timestamp.split(':')
+    return int(hours) * 3600 + int(minutes) * 60 + float(seconds)
+
+
+def format_timestamp(seconds):
+    minutes, seconds = divmod(int(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    return f"{int(hours):02d}:{int(minutes):02d}:{int(seconds):02d}"
+
+
+def estimate_tokens(text):
+    # Rough estimate (~4 characters per token) that works for both Qwen and Gemini
+    # tokenizers without pulling either of them into the service process.
+    return (len(text) + 3) // 4
+
+
+def parse_transcript(transcript):
+    segments = []
+    for line in transcript.splitlines():
+        match = LINE_PATTERN.match(line.strip())
+        if not match:
+            # Caption text can contain embedded newlines, keep them with the line they belong to
+            if segments and line.strip():
+                segments[-1]["text"] += ' ' + line.strip()
+            continue
+        start, end, speaker, text = match.groups()
+        segments.append({
+            "start": parse_timestamp(start),
+            "end": parse_timestamp(end),
+            "speaker": speaker,
+            "text": text,
+        })
+    return segments
+
+
+def clean_text(text):
+    text = NON_SPEECH_PATTERN.sub(' ', text)
+    return WHITESPACE_PATTERN.sub(' ', text).strip()
+
+
+def strip_overlap(previous_words, words):
+    # Auto-captions roll: each line often repeats the tail of the previous one.
+    # Drop the longest prefix of `words` that matches a suffix of `previous_words`.
+    # Overlaps shorter than MIN_OVERLAP_WORDS are kept, since a single repeated
+    # word ("No." / "no.") is usually real speech.
+    previous_lower = [w.lower() for w in previous_words]
+    lower = [w.lower() for w in words]
+    max_overlap = min(len(previous_words), len(words))
+    for size in range(max_overlap, MIN_OVERLAP_WORDS - 1, -1):
+        if previous_lower[-size:] == lower[:size]:
+            return words[size:]
+    return words
+
+
+def compact_segments(segments, max_paragraph_seconds=DEFAULT_MAX_PARAGRAPH_SECONDS,
+                     max_gap_seconds=DEFAULT_MAX_GAP_SECONDS, strip_rolling_duplicates=False):
+    paragraphs = []
+    current = None
+    previous_words = []
+
+    for segment in segments:
+        parts = SPEAKER_CHANGE_PATTERN.split(segment["text"])
+        for index, part in enumerate(parts):
+            # Text after a ">>" marker is a new speaker, start a new paragraph for it
+            speaker_changed = index > 0 or (current is not None and current["speaker"] != segment["speaker"])
+            if speaker_changed:
+                current = None
+                previous_words = []
+
+            words = clean_text(part).split()
+            if strip_rolling_duplicates:
+                words = strip_overlap(previous_words, words)
+            if not words:
+                continue
+            previous_words = words
+
+            can_merge = (
+                current is not None
+                and segment["start"] - current["end"] <= max_gap_seconds
+                and segment["end"] - current["start"] <= max_paragraph_seconds
+            )
+            if can_merge:
+                current["words"].extend(words)
+                current["end"] = max(current["end"], segment["end"])
+            else:
+                current = {
+                    "start": segment["start"],
+                    "end": segment["end"],
+                    "speaker": segment["speaker"],
+                    "words": list(words),
+                }
+                paragraphs.append(current)
+
+    return paragraphs
+
+
+def compact_transcript(transcript, max_paragraph_seconds=DEFAULT_MAX_PARAGRAPH_SECONDS,
+                       max_gap_seconds=DEFAULT_MAX_GAP_SECONDS, strip_rolling_duplicates=False):
+    """Merge consecutive same-speaker lines into paragraphs and drop caption noise.
+
+    `strip_rolling_duplicates` removes the text YouTube auto-captions repeat from
+    the previous line; leave it off for Whisper transcripts, which never roll.
+
+    Returns the compacted transcript (same "[start - end] speaker: text" layout) and a
+    stats dict with the estimated token counts before and after.
+    """
+    if not transcript:
+        return transcript, None
+
+    segments = parse_transcript(transcript)
+    if not segments:
+        logger.info("Transcript not in timestamped format, skipping compaction")
+        return transcript, None
+
+    paragraphs = compact_segments(segments, max_paragraph_seconds, max_gap_seconds, strip_rolling_duplicates)
+
+    compacted = ""
+    for paragraph in paragraphs:
+        start_time = format_timestamp(paragraph["start"])
+        end_time = format_timestamp(paragraph["end"])
+        text = ' '.join(paragraph["words"])
+        compacted += f"[{start_time} - {end_time}] {paragraph['speaker']}: {text}\n"
+
+    original_tokens = estimate_tokens(transcript)
+    compacted_tokens = estimate_tokens(compacted)
+    reduction = 1 - compacted_tokens / original_tokens if original_tokens else 0.0
+    stats = {
+        "original_lines": len(segments),
+        "compacted_lines": len(paragraphs),
+        "original_tokens": original_tokens,
+        "compacted_tokens": compacted_tokens,
+        "token_reduction": round(reduction, 4),
+    }
+    logger.info(f"Transcript compacted from {len(segments)} to {len(paragraphs)} lines, "
+                f"~{original_tokens} -> ~{compacted_tokens} tokens ({reduction:.1%} reduction)")
+
+    return compacted, stats
@@ -11,15 +11,9 @@ import requests
 from dotenv import load_dotenv 
 import logging
 from logging import FileHandler
-import win32serviceutil
-import win32service
-import win32event
-import servicemanager
 import sys
 import threading
 from werkzeug.serving import make_server
-import torch
-import whisperx
 from youtube_transcript_api import YouTubeTranscriptApi
 import subprocess
 import numpy as np
@@ -30,12 +24,24 @@ import jinja2
 import csv
 import io
 import ssl
+from compact_transcript import compact_transcript
+from work_queue import WorkQueue, ResultCache
+from audio_trim import trim_audio, remap_segments, frame_energy_db
+
+# The Windows service wrapper is optional so API and worker processes can also run on Linux
+try:
+    import win32serviceutil
+    import win32service
+    import win32event
+    import servicemanager
+except ImportError:
+    win32serviceutil = None
 
 ssl._create_default_https_context = ssl._create_stdlib_context
 # Set up logging
-log_dir = os.path.join(os.environ['PROGRAMDATA'], 'YouTubeTranscriptionService')
+log_dir = os.path.join(os.environ.get('PROGRAMDATA', tempfile.gettempdir()), 'YouTubeTranscriptionService')
 os.makedirs(log_dir, exist_ok=True)
-log_file = os.path.join(log_dir, 'youtube_transcription_service.log')
+log_file = os.path.join(log_dir, f"{os.environ.get('LOG_NAME', 'youtube_transcription_service')}.log")
 
 handler = FileHandler(log_file, mode='w', encoding='utf-8')
 formatter = logging.Formatter('%(asctime)s - main - %(levelname)s - %(message)s')
@@ -60,6 +66,10 @@ app = Flask(__name__)
 yt_api_Key = os.environ.get('YOUTUBE_API_KEY')
 hf_auth_token = os.environ.get('HF_AUTH_TOKEN')
 
+# Transcript compaction (merges caption lines into paragraphs before prompting)
+transcript_compaction = os.environ.get('TRANSCRIPT_COMPACTION', 'true').lower() in ('1', 'true', 'yes')
+transcript_paragraph_seconds = int(os.environ.get('TRANSCRIPT_PARAGRAPH_SECONDS', '60'))
+
 # Add this check right after loading the API key
 if not yt_api_Key:
     logger.error("YouTube API key not found. Please set YOUTUBE_API_KEY in .env file")
@@ -67,34 +77,74 @@ if not yt_api_Key:
 # Add a global variable to store the last response
 last_response_cache = None
 
+# Silence trimming before ASR: only speech spans are fed to whisper, alignment and diarization
+audio_trimming = os.environ.get('AUDIO_TRIMMING', 'true').lower() in ('1', 'true', 'yes')
+audio_trim_margin_db = float(os.environ.get('AUDIO_TRIM_MARGIN_DB', '12'))
+
+# Deployment mode: "local" runs everything in this process, "split" makes this process a
+# stateless API front that hands work to worker.py processes through a shared SQLite queue
+deployment_mode = os.environ.get('DEPLOYMENT_MODE', 'local').lower()
+shared_dir = os.environ.get('SHARED_DIR', os.path.join(script_dir, 'shared'))
+job_wait_timeout = int(os.environ.get('JOB_WAIT_TIMEOUT', '1800'))
+work_queue = None
+result_cache = None
+if deployment_mode == 'split':
+    work_queue = WorkQueue(os.path.join(shared_dir, 'work_queue.db'),
+                           lease_seconds=int(os.environ.get('JOB_LEASE_SECONDS', '60')))
+    result_cache = ResultCache(os.path.join(shared_dir, 'cache'))
+
+# Background transcription jobs started via /transcribe_async, keyed by job id
+transcription_jobs = {}
+transcription_jobs_lock = threading.Lock()
+MAX_TRANSCRIPTION_JOBS = 20
+
 # Global variables for models and device
 whisper_model = None
 whisper_model_name = "base"  # Set default model name to "base"
 align_model = None
 align_metadata = None
 diarize_model = None
-device = "cuda" if torch.cuda.is_available() else "cpu"
+gemini_client = None
+gemini_client_lock = threading.Lock()
+MAX_BATCH_WORKERS = 16
+# Serializes use of the shared whisper/alignment/diarization models
+model_lock = threading.Lock()
+# Resolved on first use so a split-mode API process never imports torch/whisperx
+device = None
+
+def resolve_device():
+    global device
+    if device is None:
+        import torch
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+    return device
 
 def load_models(model_name="base"):
     global align_model, align_metadata, diarize_model, device, whisper_model_name
-    logger.info(f"Using device: {device}")
+    logger.info(f"Using device: {resolve_device()}")
     whisper_model_name = model_name
     logger.info("Models will be loaded when needed")
 
 def load_whisper_model():
     global whisper_model, device, whisper_model_name
+    import whisperx
+    resolve_device()
     logger.info(f"Loading WhisperX model: {whisper_model_name}")
     whisper_model = whisperx.load_model(whisper_model_name, device, compute_type="int8" if device == "cuda" else "float32")
     logger.info("Whisper model loaded successfully")
 
 def load_align_model():
     global align_model, align_metadata, device
+    import whisperx
+    resolve_device()
     logger.info("Loading alignment model...")
     align_model, align_metadata = whisperx.load_align_model(language_code="en", device=device)
     logger.info("Alignment model loaded successfully")
 
 def load_diarize_model():
     global diarize_model, device
+    import whisperx
+    resolve_device()
     logger.info("Loading diarization model...")
     diarize_model = whisperx.DiarizationPipeline(use_auth_token=hf_auth_token, device=device)
     logger.info("Diarization model loaded successfully")
@@ -106,6 +156,7 @@ def unload_models():
     align_metadata = None
     diarize_model = None
     if device == "cuda":
+        import torch
         torch.cuda.empty_cache()
     logger.info("All models unloaded and GPU memory cleared")
 
@@ -144,45 +195,120 @@ def format_timestamp(seconds):
     hours, minutes = divmod(minutes, 60)
     return f"{int(hours):02d}:{int(minutes):02d}:{seconds:05.2f}"
 
-def transcribe_audio(audio_path, video_details):
-    global whisper_model, align_model, align_metadata, diarize_model, device
+def find_quiet_split(audio, target, search_samples, frame_samples=320):
+    # Move a window boundary to the quietest 20ms frame just before `target`
+    # so that words are less likely to be cut in half between windows.
+    start = max(0, target - search_samples)
+    region = audio[start:target]
+    energy = frame_energy_db(region, frame_samples)
+    if len(energy) == 0:
+        return target
+    return start + int(np.argmin(energy)) * frame_samples + frame_samples // 2
+
+def transcribe_in_windows(audio, language, progress_callback, sample_rate=16000):
+    batch_size = 16 if device == "cuda" else 1
+    # WhisperX merges VAD chunks to 30s and decodes them in batches, so a window of
+    # batch_size * 30s keeps every batch slot busy
+    window_seconds = 30 * batch_size
+    total_samples = len(audio)
+    window_samples = window_seconds * sample_rate
+    segments = []
+    detected_language = language
+    offset = 0
+    while offset < total_samples:
+        end = min(offset + window_samples, total_samples)
+        if end < total_samples:
+            end = find_quiet_split(audio, end, 5 * sample_rate)
+        window_result = whisper_model.transcribe(audio[offset:end], batch_size=batch_size, language=language)
+        detected_language = window_result.get("language", detected_language)
+        offset_seconds = offset / sample_rate
+        window_segments = []
+        for segment in window_result["segments"]:
+            segment["start"] += offset_seconds
+            segment["end"] += offset_seconds
+            window_segments.append(segment)
+        segments.extend(window_segments)
+        offset = end
+        progress_callback(window_segments, offset / total_samples)
+    return {"segments": segments, "language": detected_language}
+
+def format_segment(segment):
+    start_time = format_timestamp(segment["start"])
+    end_time = format_timestamp(segment["end"])
+    text = segment["text"]
+    speaker = segment.get("speaker") if isinstance(segment, dict) else None
+    return f"[{start_time} - {end_time}] {speaker}: {text}\n"
+
+def transcribe_audio(audio_path, video_details, progress_callback=None, model_name=None):
+    """Transcribe, align and diarize `audio_path`.
+
+    When `progress_callback` is given the audio is decoded in windows and
+    `progress_callback(segments, fraction)` is called after each one with the
+    newly decoded (unaligned, speakerless) segments and the fraction of audio done.
+
+    With audio trimming enabled only the speech spans are fed to the models and
+    timestamps are mapped back to the original audio. Returns the formatted
+    transcription and the trimming stats (None when trimming is disabled).
+    `model_name` selects the Whisper model; it is switched under the model lock so
+    concurrent jobs cannot swap it from under each other.
+    """
+    global whisper_model, align_model, align_metadata, diarize_model, device, whisper_model_name
+    import whisperx
     logger.info(f"Transcribing audio file: {audio_path}")
     start_time = time.time()
     
-    try:
-        load_whisper_model()
-        result = whisper_model.transcribe(audio_path, batch_size=16 if device == "cuda" else 1, language=video_details.get('language', 'en'))
-        
-        if result["language"] == 'en':
-            load_align_model()
-            result = whisperx.align(result["segments"], align_model, align_metadata, audio_path, device, return_char_alignments=False)
-
-        load_diarize_model()
-        diarize_segments = diarize_model(audio_path)
-        result = whisperx.assign_word_speakers(diarize_segments, result)
-        
-        end_time = time.time()
-        execution_time = end_time - start_time
-        
-        logger.info(f"Transcription completed in {execution_time:.2f} seconds")
-        
-        transcription = ""
-        for segment in result["segments"]:
-            start_time = format_timestamp(segment["start"])
-            end_time = format_timestamp(segment["end"])
-            text = segment["text"]
-            speaker = segment.get("speaker") if isinstance(segment, dict) else None
-            transcription += f"[{start_time} - {end_time}] {speaker}: {text}\n"
-        
-        unload_models()
+    with model_lock:
+        try:
+            if model_name and model_name != whisper_model_name:
+                logger.info(f"Requested Whisper model '{model_name}' differs from current model name '{whisper_model_name}'. Updating...")
+                whisper_model_name = model_name
+            load_whisper_model()
+            language = video_details.get('language', 'en')
+            audio = audio_path
+            timeline = None
+            trim_stats = None
+            if audio_trimming or progress_callback:
+                audio = whisperx.load_audio(audio_path)
+            if audio_trimming:
+                audio, timeline, trim_stats = trim_audio(audio, margin_db=audio_trim_margin_db)
+            if progress_callback:
+                report_progress = progress_callback
+                if timeline is not None:
+                    # Partial segments go out in original time, the models keep working in trimmed time
+                    report_progress = lambda segments, fraction: progress_callback(
+                        remap_segments([dict(segment) for segment in segments], timeline), fraction)
+                result = transcribe_in_windows(audio, language, report_progress)
+            else:
+                result = whisper_model.transcribe(audio, batch_size=16 if device == "cuda" else 1, language=language)
+            
+            if result["language"] == 'en':
+                load_align_model()
+                result = whisperx.align(result["segments"], align_model, align_metadata, audio, device, return_char_alignments=False)
+
+            load_diarize_model()
+            diarize_segments = diarize_model(audio)
+            result = whisperx.assign_word_speakers(diarize_segments, result)
+            if timeline is not None:
+                remap_segments(result["segments"], timeline)
+            
+            end_time = time.time()
+            execution_time = end_time - start_time
+            
+            logger.info(f"Transcription completed in {execution_time:.2f} seconds")
+            
+            transcription = ""
+            for segment in result["segments"]:
+                transcription += format_segment(segment)
+            
+            unload_models()
+            
+            return transcription, trim_stats
         
-        return transcription
-    
-    except Exception as e:
-        logger.error(f"Error during transcription: {e}")
-        traceback.print_exc()
-        unload_models()
-        return None
+        except Exception as e:
+            logger.error(f"Error during transcription: {e}")
+            traceback.print_exc()
+            unload_models()
+            return None, None
     
 def format_timestamp(seconds):
     minutes, seconds = divmod(int(seconds), 60)
@@ -191,7 +317,7 @@ def format_timestamp(seconds):
 
 @app.route('/transcribe', methods=['POST'])
 def transcribe():
-    global last_response_cache, whisper_model_name
+    global last_response_cache
     
     logger.info("Received transcription request")
     
@@ -201,9 +327,9 @@ def transcribe():
         logger.error(error_msg)
         return jsonify({"error": error_msg}), 500
     
-    video_url = request.json.get('url')
-    transcription_method = request.json.get('transcriptionMethod')
-    process_locally = request.json.get('processLocally', False)
+    params = get_transcription_params(request.json)
+    video_url = params['url']
+    transcription_method = params['transcriptionMethod']
     
     if not video_url:
         logger.error("No URL provided in the request")
@@ -215,13 +341,68 @@ def transcribe():
     
     logger.info(f"Processing video URL: {video_url}")
     logger.info(f"Transcription method: {transcription_method}")
-    logger.info(f"Process locally: {process_locally}")
+    logger.info(f"Process locally: {params['processLocally']}")
     
-    # Check if the cached response exists and the URL matches
-    if last_response_cache and last_response_cache['url'] == video_url:
+    if deployment_mode == 'split':
+        # Stateless front: the shared cache replaces last_response_cache and a worker does the work
+        cached = result_cache.get(make_cache_key(params))
+        if cached:
+            logger.info("Returning cached response")
+            return jsonify({"prompt": cached['prompt'], "cached": True})
+
+        job_id = work_queue.enqueue(params)
+        logger.info(f"Waiting for job {job_id}")
+        job = work_queue.wait(job_id, timeout=job_wait_timeout)
+        if job is None:
+            return jsonify({"error": "Timed out waiting for a worker", "job_id": job_id}), 504
+        if job["status"] == 'error':
+            return jsonify({"error": job["error"]}), 500
+        payload, status_code = job["result"]["payload"], job["result"]["status_code"]
+        if 'response' in payload:
+            payload.pop('prompt', None)
+        return jsonify(payload), status_code
+
+    # Check if the cached response exists and matches the URL and compaction setting
+    if last_response_cache and last_response_cache['key'] == make_cache_key(params):
         logger.info("Returning cached response")
         return jsonify({"prompt": last_response_cache['prompt'], "cached": True})
     
+    payload, status_code = run_pipeline(params)
+    if status_code == 200:
+        logger.info("Updating cache with new response")
+        last_response_cache = {"key": make_cache_key(params), "prompt": payload.pop('prompt')}
+        if 'response' not in payload:
+            payload['prompt'] = last_response_cache['prompt']
+    return jsonify(payload), status_code
+
+def get_transcription_params(data):
+    return {
+        "url": data.get('url'),
+        "transcriptionMethod": data.get('transcriptionMethod'),
+        "processLocally": data.get('processLocally', False),
+        "llmBackend": data.get('llmBackend', 'llama'),
+        "compactTranscript": data.get('compactTranscript', transcript_compaction),
+        "whisperModel": data.get('whisperModel', 'base'),
+        # Decode in windows and publish partial segments; only /transcribe_async sets this
+        "progressive": False,
+    }
+
+def make_cache_key(params):
+    return ResultCache.make_key(params['url'], params['transcriptionMethod'], params['whisperModel'],
+                                bool(params['compactTranscript']))
+
+def run_pipeline(params, report=None):
+    """Fetch details, transcribe, compact and build the prompt (and summary when processing locally).
+
+    `report(stage, percent=None, segments=())` receives progress updates. Returns a
+    (payload, status_code) tuple; on success the payload always contains the prompt.
+    """
+    progressive = params.get('progressive', False)
+    report = report or (lambda stage, percent=None, segments=(): None)
+    video_url = params['url']
+    transcription_method = params['transcriptionMethod']
+    trim_stats = None
+    
     logger.info("Extracting video ID")
     video_id = extract_video_id(video_url)
     
@@ -230,74 +411,189 @@ def transcribe():
     
     if video_details is None:
         logger.error("Failed to retrieve video details")
-        return jsonify({"error": "Failed to retrieve video details"}), 500
+        return {"error": "Failed to retrieve video details"}, 500
     
     if transcription_method == 'whisper':
-        whisper_model_requested = request.json.get('whisperModel', 'base')
-        if whisper_model_requested != whisper_model_name:
-            logger.info(f"Requested Whisper model '{whisper_model_requested}' differs from current model name '{whisper_model_name}'. Updating...")
-            whisper_model_name = whisper_model_requested
-        
         logger.info("Using local transcription with WhisperX")
         logger.info("Downloading YouTube audio")
+        report("downloading")
         audio_path = download_youtube_audio(video_url)
         if not audio_path:
             logger.error("Failed to download audio")
-            return jsonify({"error": "Failed to download audio"}), 500
+            return {"error": "Failed to download audio"}, 500
         
+        def on_progress(segments, fraction):
+            # Alignment and diarization still run after decoding, keep some headroom
+            report("transcribing" if fraction < 1 else "aligning", fraction * 90,
+                   [format_segment(segment) for segment in segments])
+
         logger.info("Transcribing audio")
-        transcript = transcribe_audio(audio_path, video_details)
+        report("transcribing", 0)
+        transcript, trim_stats = transcribe_audio(audio_path, video_details, progress_callback=on_progress if progressive else None,
+                                                  model_name=params['whisperModel'])
         
         try:
             logger.info("Removing temporary audio file")
             os.remove(audio_path)
         except Exception as e:
             logger.error(f"Error removing temporary file: {e}")
+
+        if transcript is None:
+            return {"error": "Transcription failed"}, 500
     elif transcription_method == 'youtube':
         logger.info("Using transcript from YouTube API")
         transcript = video_details.get('transcript')
         if not transcript:
             logger.error("Failed to fetch transcript from YouTube API")
-            return jsonify({"error": "Failed to fetch transcript from YouTube API"}), 500
+            return {"error": "Failed to fetch transcript from YouTube API"}, 500
     else:
         logger.error(f"Invalid transcription method: {transcription_method}")
-        return jsonify({"error": "Invalid transcription method"}), 400
+        return {"error": "Invalid transcription method"}, 400
 
-    logger.info("Generating prompt")
-    prompt_template = load_prompt_template()
-    if not prompt_template:
-        return jsonify({"error": "Failed to load prompt template"}), 500
+    compaction_stats = None
+    if params['compactTranscript']:
+        logger.info("Compacting transcript")
+        transcript, compaction_stats = compact_transcript(transcript, max_paragraph_seconds=transcript_paragraph_seconds,
+                                                          strip_rolling_duplicates=transcription_method == 'youtube')
 
-    template = jinja2.Template(prompt_template)
-    prompt = template.render(
-        channel=video_details.get('channel', 'Unknown'),
-        title=video_details.get('title', 'Unknown'),
-        views=video_details.get('views', 'Unknown'),
-        likes=video_details.get('likes', 'Unknown'),
-        description=video_details.get('description', 'Unknown'),
-        video_url=video_url,
-        transcript=transcript or 'Transcription failed'
-    )
+    logger.info("Generating prompt")
+    prompt = build_prompt(video_details, video_url, transcript)
+    if not prompt:
+        logger.error("Failed to generate prompt")
+        return {"error": "Failed to generate prompt"}, 500
 
-    logger.info("Copying prompt to clipboard")
-    pyperclip.copy(prompt)
+    if deployment_mode == 'local':
+        logger.info("Copying prompt to clipboard")
+        pyperclip.copy(prompt)
 
-    if prompt:
-        logger.info("Updating cache with new response")
-        last_response_cache = {"url": video_url, "prompt": str(prompt)}
-        
-        if process_locally:
+    if params['processLocally']:
+        report("summarizing", 95)
+        if params['llmBackend'] == 'gemini':
+            logger.info("Processing prompt in-process with Gemini")
+            response = process_with_gemini_client(prompt)
+        else:
             logger.info("Processing prompt locally with Llama 3.1 8B model")
             response = process_with_llama(prompt)
-            # Save the prompt and result immediately for local processing
-            save_prompt_and_result_to_csv(prompt, response)
-            return jsonify({"response": response, "cached": False})
-        else:
-            logger.info("Returning prompt for external processing")
-            return jsonify({"prompt": str(prompt), "cached": False, "video_url": video_url})
-    else:
-        logger.error("Failed to generate prompt")
-        return jsonify({"error": "Failed to generate prompt"}), 500
+        # Save the prompt and result immediately for local processing
+        save_prompt_and_result_to_csv(prompt, response)
+        return {"prompt": str(prompt), "response": response, "cached": False, "compaction": compaction_stats, "trimming": trim_stats}, 200
+
+    logger.info("Returning prompt for external processing")
+    return {"prompt": str(prompt), "cached": False, "video_url": video_url, "compaction": compaction_stats, "trimming": trim_stats}, 200
+
+@app.route('/transcribe_async', methods=['POST'])
+def transcribe_async():
+    logger.info("Received async transcription request")
+
+    if not yt_api_Key:
+        error_msg = "YouTube API key not configured. Please set YOUTUBE_API_KEY in the .env file"
+        logger.error(error_msg)
+        return jsonify({"error": error_msg}), 500
+
+    params = get_transcription_params(request.json)
+    if not params['url']:
+        logger.error("No URL provided in the request")
+        return jsonify({"error": "No URL provided"}), 400
+    params['transcriptionMethod'] = 'whisper'
+    params['progressive'] = True
+
+    if deployment_mode == 'split':
+        job_id = work_queue.enqueue(params)
+        return jsonify({"job_id": job_id}), 202
+
+    job_id = str(uuid.uuid4())
+    job = {
+        "status": "queued",
+        "percent": 0.0,
+        "segments": [],
+        "prompt": None,
+        # Summary from the local model / Gemini when processLocally is set
+        "response": None,
+        "error": None,
+        "compaction": None,
+        "trimming": None,
+    }
+    with transcription_jobs_lock:
+        transcription_jobs[job_id] = job
+        # Only keep the most recent finished jobs around, running jobs are never evicted
+        finished = [key for key, value in transcription_jobs.items() if value["status"] in ('done', 'error')]
+        for key in finished[:max(0, len(transcription_jobs) - MAX_TRANSCRIPTION_JOBS)]:
+            transcription_jobs.pop(key)
+
+    threading.Thread(target=run_transcription_job, args=(job, params), daemon=True).start()
+
+    logger.info(f"Started transcription job {job_id} for {params['url']}")
+    return jsonify({"job_id": job_id}), 202
+
+@app.route('/transcribe_status/<job_id>', methods=['GET'])
+def transcribe_status(job_id):
+    # `since` lets pollers fetch only the segments they have not seen yet
+    since = request.args.get('since', 0, type=int)
+
+    if deployment_mode == 'split':
+        job = work_queue.get(job_id, since=since)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+        result = job["result"] or {}
+        payload = result.get("payload", {})
+        error = job["error"] or (payload.get("error") if result.get("status_code") != 200 else None)
+        return jsonify({
+            "status": "error" if error else job["stage"],
+            "percent": round(job["percent"], 1),
+            # Segments restart from 0 when a job is reclaimed, pollers reset `since` when this changes
+            "attempts": job["attempts"],
+            "segments": job["segments"],
+            "next": since + len(job["segments"]),
+            "prompt": payload.get("prompt"),
+            "response": payload.get("response"),
+            "compaction": payload.get("compaction"),
+            "trimming": payload.get("trimming"),
+            "error": error,
+        })
+
+    with transcription_jobs_lock:
+        job = transcription_jobs.get(job_id)
+        if job is None:
+            return jsonify({"error": "Unknown job"}), 404
+
+        segments = job["segments"][since:]
+        return jsonify({
+            "status": job["status"],
+            "percent": round(job["percent"], 1),
+            "attempts": 1,
+            "segments": segments,
+            "next": since + len(segments),
+            "prompt": job["prompt"],
+            "response": job["response"],
+            "compaction": job["compaction"],
+            "trimming": job["trimming"],
+            "error": job["error"],
+        })
+
+def run_transcription_job(job, params):
+    global last_response_cache
+
+    def report(stage, percent=None, segments=()):
+        with transcription_jobs_lock:
+            job["status"] = stage
+            if percent is not None:
+                job["percent"] = percent
+            job["segments"].extend(segments)
+
+    try:
+        payload, status_code = run_pipeline(params, report)
+        with transcription_jobs_lock:
+            if status_code != 200:
+                job.update(status="error", error=payload.get("error"))
+                return
+            job.update(status="done", percent=100.0, prompt=payload["prompt"], response=payload.get("response"),
+                       compaction=payload["compaction"], trimming=payload["trimming"])
+        last_response_cache = {"key": make_cache_key(params), "prompt": payload["prompt"]}
+    except Exception as e:
+        logger.error(f"Error in transcription job: {e}")
+        traceback.print_exc()
+        with transcription_jobs_lock:
+            job.update(status="error", error=str(e))
 
 @app.route('/save_result', methods=['POST'])
 def save_result():
@@ -316,6 +612,28 @@ def save_result():
         logger.error(f"Error saving result: {e}")
         return jsonify({"error": "Failed to save result"}), 500
 
+@app.route('/summarize_batch', methods=['POST'])
+def summarize_batch():
+    prompts = request.json.get('prompts')
+
+    if not prompts or not isinstance(prompts, list):
+        logger.error("No prompts provided in summarize_batch request")
+        return jsonify({"error": "prompts must be a non-empty list"}), 400
+
+    try:
+        max_workers = int(request.json.get('maxWorkers', 4))
+    except (TypeError, ValueError):
+        logger.error("Invalid maxWorkers in summarize_batch request")
+        return jsonify({"error": "maxWorkers must be an integer"}), 400
+    max_workers = min(max(max_workers, 1), MAX_BATCH_WORKERS)
+
+    client = get_gemini_client()
+    if client is None:
+        return jsonify({"error": "Gemini client not configured. Please set GEMINI_API_KEY in the .env file"}), 500
+
+    responses = client.generate_batch(prompts, max_workers=max_workers)
+    return jsonify({"responses": responses})
+
 def extract_video_id(url):
     logger.info(f"Extracting video ID from URL: {url}")
     video_id = re.findall(r"v=(\S{11})", url)[0]
@@ -390,7 +708,7 @@ def format_youtube_transcript(transcript_data):
     for entry in transcript_data:
         start_time = format_timestamp(entry['start'])
         end_time = format_timestamp(entry['start'] + entry['duration'])
-        text = entry['text']
+        text = entry['text'].replace('\n', ' ')
         formatted_transcript += f"[{start_time} - {end_time}] SPEAKER_00: {text}\n"
     return formatted_transcript
 
@@ -400,10 +718,14 @@ def shutdown_server():
         raise RuntimeError('Not running with the Werkzeug Server')
     func()
 
+def get_api_port():
+    # Read at call time: the Windows service reloads .env just before starting the server
+    return int(os.environ.get('API_PORT', '5000'))
+
 class ServerThread(threading.Thread):
-    def __init__(self, app):
+    def __init__(self, app, port=5000):
         threading.Thread.__init__(self)
-        self.server = make_server('0.0.0.0', 5000, app)
+        self.server = make_server('0.0.0.0', port, app)
         self.ctx = app.app_context()
         self.ctx.push()
 
@@ -414,66 +736,68 @@ class ServerThread(threading.Thread):
     def shutdown(self):
         self.server.shutdown()
 
-class YouTubeTranscriptionService(win32serviceutil.ServiceFramework):
-    _svc_name_ = "YouTubeTranscriptionService"
-    _svc_display_name_ = "YouTube Transcription Service"
-    _svc_description_ = "A service for transcribing YouTube videos"
-
-    def __init__(self, args):
-        win32serviceutil.ServiceFramework.__init__(self, args)
-        self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
-        self.is_alive = True
-        self.thread = None
-
-    def SvcStop(self):
-        self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
-        win32event.SetEvent(self.hWaitStop)
-        self.is_alive = False
-        if self.thread:
-            self.thread.join(timeout=10)  # Wait for up to 10 seconds for the thread to finish
-        self.ReportServiceStatus(win32service.SERVICE_STOPPED)
-
-    def SvcDoRun(self):
-        servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
-                              servicemanager.PYS_SERVICE_STARTED,
-                              (self._svc_name_, ''))
+if win32serviceutil is not None:
+    class YouTubeTranscriptionService(win32serviceutil.ServiceFramework):
+        _svc_name_ = "YouTubeTranscriptionService"
+        _svc_display_name_ = "YouTube Transcription Service"
+        _svc_description_ = "A service for transcribing YouTube videos"
+
+        def __init__(self, args):
+            win32serviceutil.ServiceFramework.__init__(self, args)
+            self.hWaitStop = win32event.CreateEvent(None, 0, 0, None)
+            self.is_alive = True
+            self.thread = None
+
+        def SvcStop(self):
+            self.ReportServiceStatus(win32service.SERVICE_STOP_PENDING)
+            win32event.SetEvent(self.hWaitStop)
+            self.is_alive = False
+            if self.thread:
+                self.thread.join(timeout=10)  # Wait for up to 10 seconds for the thread to finish
+            self.ReportServiceStatus(win32service.SERVICE_STOPPED)
+
+        def SvcDoRun(self):
+            servicemanager.LogMsg(servicemanager.EVENTLOG_INFORMATION_TYPE,
+                                  servicemanager.PYS_SERVICE_STARTED,
+                                  (self._svc_name_, ''))
         
-        logger.info(f"Current working directory: {os.getcwd()}")
-        logger.info(f"Script directory: {os.path.dirname(os.path.abspath(__file__))}")
+            logger.info(f"Current working directory: {os.getcwd()}")
+            logger.info(f"Script directory: {os.path.dirname(os.path.abspath(__file__))}")
         
-        # Reload environment variables
-        script_dir = os.path.dirname(os.path.abspath(__file__))
-        dotenv_path = os.path.join(script_dir, '.env')
-        load_dotenv(dotenv_path)
+            # Reload environment variables
+            script_dir = os.path.dirname(os.path.abspath(__file__))
+            dotenv_path = os.path.join(script_dir, '.env')
+            load_dotenv(dotenv_path)
         
-        global yt_api_Key, hf_auth_token
-        yt_api_Key = os.environ.get('YOUTUBE_API_KEY')
-        hf_auth_token = os.environ.get('HF_AUTH_TOKEN')
-        if not yt_api_Key:
-            logger.error(f"YouTube API key not found in environment variables. Checked .env file at: {dotenv_path}")
-        else:
-            logger.info("YouTube API key loaded successfully")
-        if not hf_auth_token:
-            logger.error(f"Hugging Face auth token not found in environment variables. Checked .env file at: {dotenv_path}")
-        else:
-            logger.info("Hugging Face auth token loaded successfully")
+            global yt_api_Key, hf_auth_token
+            yt_api_Key = os.environ.get('YOUTUBE_API_KEY')
+            hf_auth_token = os.environ.get('HF_AUTH_TOKEN')
+            if not yt_api_Key:
+                logger.error(f"YouTube API key not found in environment variables. Checked .env file at: {dotenv_path}")
+            else:
+                logger.info("YouTube API key loaded successfully")
+            if not hf_auth_token:
+                logger.error(f"Hugging Face auth token not found in environment variables. Checked .env file at: {dotenv_path}")
+            else:
+                logger.info("Hugging Face auth token loaded successfully")
         
-        # Load models before starting the server thread
-        load_models()
+            # Load models before starting the server thread
+            if deployment_mode == 'local':
+                load_models()
         
-        self.thread = threading.Thread(target=self.main)
-        self.thread.start()
-        win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
-
-    def main(self):
-        ip_address = get_local_ip()
-        port = 5000  # You can change this if needed
-        logger.info(f"Starting server. API will be accessible at http://{ip_address}:{port}")
-        server = ServerThread(app)
-        server.start()
-        while self.is_alive:
-            time.sleep(1)
-        server.shutdown()
+            self.thread = threading.Thread(target=self.main)
+            self.thread.start()
+            win32event.WaitForSingleObject(self.hWaitStop, win32event.INFINITE)
+
+        def main(self):
+            ip_address = get_local_ip()
+            port = get_api_port()
+            logger.info(f"Starting server ({deployment_mode} mode). API will be accessible at http://{ip_address}:{port}")
+            server = ServerThread(app, port)
+            server.start()
+            while self.is_alive:
+                time.sleep(1)
+            server.shutdown()
 
 def get_local_ip():
     try:
@@ -488,14 +812,17 @@ def get_local_ip():
         return '127.0.0.1'  # Return localhost if an error occurs
     
 def run_server():
-    load_models("base")  # Explicitly load the "base" model on startup
+    if deployment_mode == 'local':
+        load_models("base")  # Explicitly load the "base" model on startup
     
     # Get the actual IP address of the machine
     ip_address = get_local_ip()
     
+    port = get_api_port()
+    
     # Add this log message with the correct IP address
-    logger.info(f"Starting server. API will be accessible at http://{ip_address}:5000")
-    app.run(host='0.0.0.0', port=5000)
+    logger.info(f"Starting server ({deployment_mode} mode). API will be accessible at http://{ip_address}:{port}")
+    app.run(host='0.0.0.0', port=port)
 
 def process_with_llama(prompt):
     logger.info("Processing prompt with Local model")
@@ -545,6 +872,42 @@ def process_with_llama(prompt):
         logger.error(f"Unexpected error in process_with_llama: {e}")
         return f"Unexpected error: {str(e)}"
 
+def get_gemini_client():
+    global gemini_client
+    with gemini_client_lock:
+        if gemini_client is None:
+            try:
+                # Imported lazily so google-generativeai is only needed when Gemini is used
+                from run_gemini import create_client_from_env
+                gemini_client = create_client_from_env()
+            except Exception as e:
+                logger.error(f"Error creating Gemini client: {e}")
+        return gemini_client
+
+def process_with_gemini_client(prompt):
+    logger.info("Processing prompt with Gemini model")
+    client = get_gemini_client()
+    if client is None:
+        return "Error processing with Gemini model: GEMINI_API_KEY not configured"
+    from run_gemini import process_with_gemini
+    return process_with_gemini(prompt, client)
+
+def build_prompt(video_details, video_url, transcript):
+    prompt_template = load_prompt_template()
+    if not prompt_template:
+        return None
+
+    template = jinja2.Template(prompt_template)
+    return template.render(
+        channel=video_details.get('channel', 'Unknown'),
+        title=video_details.get('title', 'Unknown'),
+        views=video_details.get('views', 'Unknown'),
+        likes=video_details.get('likes', 'Unknown'),
+        description=video_details.get('description', 'Unknown'),
+        video_url=video_url,
+        transcript=transcript or 'Transcription failed'
+    )
+
 def load_prompt_template():
     template_path = os.path.join(script_dir, 'prompt_template.txt')
     try:
@@ -585,6 +948,9 @@ def save_prompt_and_result_to_csv(prompt, result):
 
 if __name__ == '__main__':
     if len(sys.argv) > 1:
+        if win32serviceutil is None:
+            print("Windows service commands require pywin32")
+            sys.exit(1)
         win32serviceutil.HandleCommandLine(YouTubeTranscriptionService)
     else:
         print("Running as standalone script...")
@@ -1,8 +1,14 @@
 import os
 import sys
+import time
+import random
 import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
 from dotenv import load_dotenv
+from compact_transcript import estimate_tokens
 
 # Set up logging
 log_file_path = os.environ.get('LOG_FILE_PATH')
@@ -20,36 +26,153 @@ script_dir = os.path.dirname(os.path.abspath(__file__))
 dotenv_path = os.path.join(script_dir, '.env')
 load_dotenv(dotenv_path)
 
-# Configure Google AI
-api_key = os.environ.get("GEMINI_API_KEY")
-if not api_key:
-    logger.error("GEMINI_API_KEY not found in environment variables")
-    sys.exit(1)
+DEFAULT_MODEL_NAME = 'gemini-1.5-pro-exp-0827'#'gemini-1.5-flash-8b-exp-0924',#"gemini-1.5-pro-002",
+DEFAULT_GENERATION_CONFIG = {
+    "temperature": 1,
+    "top_p": 0.95,
+    "top_k": 64,
+    "max_output_tokens": 8192,
+    "response_mime_type": "text/plain",
+}
 
-genai.configure(api_key=api_key)
+# Errors worth retrying: 429 (quota / rate limit) and transient server side failures
+RETRYABLE_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.TooManyRequests,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.InternalServerError,
+)
 
-def process_with_gemini(prompt):
-    try:
-        # Create the model
-        generation_config = {
-            "temperature": 1,
-            "top_p": 0.95,
-            "top_k": 64,
-            "max_output_tokens": 8192,
-            "response_mime_type": "text/plain",
-        }
-
-        model = genai.GenerativeModel(
-            model_name='gemini-1.5-pro-exp-0827',#'gemini-1.5-flash-8b-exp-0924',#"gemini-1.5-pro-002",
-            generation_config=generation_config,
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `capacity` units per minute."""
+
+    def __init__(self, capacity_per_minute):
+        self.capacity = float(capacity_per_minute)
+        self.tokens = self.capacity
+        self.rate = self.capacity / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1):
+        # A single request larger than the bucket can never fit, so cap it to a full bucket
+        amount = min(float(amount), self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        # Settle a reservation once the real cost is known; a positive amount may leave
+        # the bucket in debt, which later acquire() calls wait out
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class GeminiClient:
+    """In-process Gemini backend.
+
+    The client is configured and the model built once, then shared by all callers.
+    Requests are throttled by requests-per-minute and tokens-per-minute buckets and
+    retried with exponential backoff on 429 and transient errors. `api_endpoint`
+    (e.g. "http://127.0.0.1:8080") points the REST transport at a local stub server.
+    """
+
+    def __init__(self, api_key, model_name=DEFAULT_MODEL_NAME, generation_config=None,
+                 requests_per_minute=15, tokens_per_minute=1000000, max_retries=5,
+                 api_endpoint=None):
+        client_options = {"api_endpoint": api_endpoint} if api_endpoint else None
+        genai.configure(api_key=api_key, transport="rest", client_options=client_options)
+
+        self.model_name = model_name
+        self.model = genai.GenerativeModel(
+            model_name=model_name,
+            generation_config=generation_config or DEFAULT_GENERATION_CONFIG,
         )
+        self.request_bucket = TokenBucket(requests_per_minute)
+        self.token_bucket = TokenBucket(tokens_per_minute)
+        self.max_retries = max_retries
+        logger.info(f"Gemini client ready: model={model_name}, rpm={requests_per_minute}, tpm={tokens_per_minute}")
 
-        chat_session = model.start_chat(history=[])
+    def generate(self, prompt):
+        # Reserve the estimated prompt tokens up front and charge the rest once the
+        # response reports what the request really cost (output counts against TPM too)
+        reserved = estimate_tokens(prompt)
+        for attempt in range(self.max_retries + 1):
+            self.request_bucket.acquire()
+            self.token_bucket.acquire(reserved)
+            try:
+                response = self.model.generate_content(prompt)
+                self.token_bucket.adjust(self.token_cost(response, reserved) - reserved)
+                return response.text
+            except RETRYABLE_ERRORS as e:
+                if attempt == self.max_retries:
+                    raise
+                delay = min(60, 2 ** attempt) + random.uniform(0, 1)
+                logger.warning(f"Gemini request throttled ({e.__class__.__name__}), retrying in {delay:.1f}s "
+                               f"(attempt {attempt + 1}/{self.max_retries})")
+                time.sleep(delay)
 
-        # Send the prompt to the model
-        response = chat_session.send_message(prompt)
+    @staticmethod
+    def token_cost(response, prompt_tokens):
+        usage = getattr(response, "usage_metadata", None)
+        if usage and usage.total_token_count:
+            return usage.total_token_count
+        # No usage reported, fall back to the local estimate
+        try:
+            return prompt_tokens + estimate_tokens(response.text)
+        except ValueError:
+            # Blocked responses have no text
+            return prompt_tokens
 
-        return response.text
+    def generate_batch(self, prompts, max_workers=4):
+        """Run `prompts` concurrently; results keep the input order.
+
+        A failed prompt yields an error string in its slot instead of aborting the batch.
+        """
+        def run(prompt):
+            try:
+                return self.generate(prompt)
+            except Exception as e:
+                logger.error(f"Error processing with Gemini model: {e}")
+                return f"Error processing with Gemini model: {str(e)}"
+
+        logger.info(f"Processing batch of {len(prompts)} prompts with Gemini ({max_workers} workers)")
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(run, prompts))
+
+
+def create_client_from_env():
+    api_key = os.environ.get("GEMINI_API_KEY")
+    if not api_key:
+        logger.error("GEMINI_API_KEY not found in environment variables")
+        return None
+
+    return GeminiClient(
+        api_key,
+        model_name=os.environ.get("GEMINI_MODEL", DEFAULT_MODEL_NAME),
+        requests_per_minute=int(os.environ.get("GEMINI_RPM", "15")),
+        tokens_per_minute=int(os.environ.get("GEMINI_TPM", "1000000")),
+        api_endpoint=os.environ.get("GEMINI_API_ENDPOINT"),
+    )
+
+
+def process_with_gemini(prompt, client=None):
+    try:
+        client = client or create_client_from_env()
+        if client is None:
+            return "Error processing with Gemini model: GEMINI_API_KEY not configured"
+        return client.generate(prompt)
 
     except Exception as e:
         logger.error(f"Error processing with Gemini model: {e}")
@@ -69,6 +192,10 @@ if __name__ == "__main__":
         logger.error(f"Error reading prompt file: {e}")
         sys.exit(1)
 
+    client = create_client_from_env()
+    if client is None:
+        sys.exit(1)
+
     # Process the prompt and print the result
-    result = process_with_gemini(prompt)
-    print(result)
\ No newline at end of file
+    result = process_with_gemini(prompt, client)
+    print(result)
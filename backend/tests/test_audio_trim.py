@@ -0,0 +1,95 @@
+import numpy as np
+import pytest
+
+from audio_trim import build_speech_timeline, trim_audio, map_time, remap_segments
+
+SAMPLE_RATE = 16000
+# 20ms frames and 250ms padding keep every boundary on a whole frame
+OPTIONS = {"frame_seconds": 0.02, "pad_seconds": 0.25}
+
+
+def tone(seconds):
+    t = np.arange(int(seconds * SAMPLE_RATE)) / SAMPLE_RATE
+    return (0.5 * np.sin(2 * np.pi * 440 * t)).astype(np.float32)
+
+
+def silence(seconds):
+    return np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+
+
+@pytest.fixture
+def speech_pause_speech():
+    # 1s speech, 3s silence, 1s speech
+    return np.concatenate([tone(1), silence(3), tone(1)])
+
+
+def test_long_silence_is_cut_with_padding(speech_pause_speech):
+    spans = build_speech_timeline(speech_pause_speech, SAMPLE_RATE, **OPTIONS)
+
+    assert spans.tolist() == [[0, 20000], [60000, 80000]]
+
+
+def test_short_pause_is_kept():
+    audio = np.concatenate([tone(1), silence(0.5), tone(1)])
+
+    spans = build_speech_timeline(audio, SAMPLE_RATE, **OPTIONS)
+
+    assert spans.tolist() == [[0, len(audio)]]
+
+
+def test_all_silent_input_is_kept_whole():
+    audio = silence(2)
+
+    trimmed, timeline, stats = trim_audio(audio, SAMPLE_RATE, **OPTIONS)
+
+    assert len(trimmed) == len(audio)
+    assert stats["skipped_fraction"] == 0
+    assert float(map_time(1.5, timeline)) == 1.5
+
+
+def test_input_shorter_than_one_frame_is_kept_whole():
+    audio = tone(0.01)
+
+    spans = build_speech_timeline(audio, SAMPLE_RATE, **OPTIONS)
+    trimmed, timeline, stats = trim_audio(audio, SAMPLE_RATE, **OPTIONS)
+
+    assert spans.tolist() == [[0, len(audio)]]
+    assert len(trimmed) == len(audio)
+    assert stats["speech_spans"] == 1
+
+
+def test_trim_audio_timeline(speech_pause_speech):
+    trimmed, timeline, stats = trim_audio(speech_pause_speech, SAMPLE_RATE, **OPTIONS)
+
+    assert len(trimmed) == 40000
+    assert timeline["trimmed_starts"].tolist() == [0, 1.25]
+    assert timeline["original_starts"].tolist() == [0, 3.75]
+    assert stats["original_seconds"] == 5
+    assert stats["trimmed_seconds"] == 2.5
+    assert stats["skipped_fraction"] == 0.5
+
+
+def test_map_time_on_join_depends_on_side(speech_pause_speech):
+    _, timeline, _ = trim_audio(speech_pause_speech, SAMPLE_RATE, **OPTIONS)
+
+    assert map_time(0.5, timeline) == 0.5
+    assert map_time(2.0, timeline) == 4.5
+    # The join at 1.25s trimmed is both the end of the first span and the start of the second
+    assert map_time(1.25, timeline, side='right') == 3.75
+    assert map_time(1.25, timeline, side='left') == 1.25
+    assert map_time(np.array([0.5, 1.25, 2.0]), timeline).tolist() == [0.5, 3.75, 4.5]
+
+
+def test_remap_segments_maps_starts_right_and_ends_left(speech_pause_speech):
+    _, timeline, _ = trim_audio(speech_pause_speech, SAMPLE_RATE, **OPTIONS)
+    segments = [
+        {"start": 0.25, "end": 1.25, "words": [{"start": 0.25, "end": 1.0}, {"start": 1.0, "end": 1.25}]},
+        {"start": 1.25, "end": 2.0, "words": [{"start": 1.25, "end": 2.0}, {"word": "unaligned"}]},
+    ]
+
+    remap_segments(segments, timeline)
+
+    assert segments[0] == {"start": 0.25, "end": 1.25,
+                           "words": [{"start": 0.25, "end": 1.0}, {"start": 1.0, "end": 1.25}]}
+    assert segments[1] == {"start": 3.75, "end": 4.5,
+                           "words": [{"start": 3.75, "end": 4.5}, {"word": "unaligned"}]}
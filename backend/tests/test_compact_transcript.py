@@ -0,0 +1,107 @@
+from compact_transcript import (
+    clean_text,
+    compact_transcript,
+    parse_transcript,
+    strip_overlap,
+)
+
+
+def test_parse_transcript_reads_headers_and_joins_continuation_lines():
+    transcript = (
+        "[00:00:01 - 00:00:03] SPEAKER_00: hello everyone and\n"
+        "welcome back to the channel\n"
+        "[00:01:02 - 00:01:04] SPEAKER_01: hi\n"
+    )
+
+    segments = parse_transcript(transcript)
+
+    assert segments == [
+        {"start": 1, "end": 3, "speaker": "SPEAKER_00", "text": "hello everyone and welcome back to the channel"},
+        {"start": 62, "end": 64, "speaker": "SPEAKER_01", "text": "hi"},
+    ]
+
+
+def test_clean_text_drops_non_speech_tokens():
+    assert clean_text("[Music] so ♪ la la ♪ here  we [Applause] go") == "so la la here we go"
+
+
+def test_strip_overlap_removes_rolling_prefix():
+    assert strip_overlap("and welcome to the".split(), "to the show".split()) == ["show"]
+
+
+def test_strip_overlap_keeps_single_word_repeats():
+    assert strip_overlap(["No."], ["no."]) == ["no."]
+    assert strip_overlap(["and"], ["and", "then"]) == ["and", "then"]
+
+
+def test_compact_merges_same_speaker_lines():
+    transcript = (
+        "[00:00:00 - 00:00:02] SPEAKER_00: first\n"
+        "[00:00:02 - 00:00:04] SPEAKER_00: second\n"
+        "[00:00:04 - 00:00:06] SPEAKER_01: third\n"
+    )
+
+    compacted, stats = compact_transcript(transcript)
+
+    assert compacted == (
+        "[00:00:00 - 00:00:04] SPEAKER_00: first second\n"
+        "[00:00:04 - 00:00:06] SPEAKER_01: third\n"
+    )
+    assert stats["original_lines"] == 3
+    assert stats["compacted_lines"] == 2
+
+
+def test_compact_splits_long_paragraphs_and_gaps():
+    transcript = (
+        "[00:00:00 - 00:00:30] SPEAKER_00: a\n"
+        "[00:00:30 - 00:01:10] SPEAKER_00: b\n"
+        "[00:01:20 - 00:01:21] SPEAKER_00: c\n"
+    )
+
+    compacted, _ = compact_transcript(transcript, max_paragraph_seconds=60, max_gap_seconds=5)
+
+    assert compacted.count("\n") == 3
+
+
+def test_rolling_duplicates_only_stripped_when_requested():
+    transcript = (
+        "[00:00:00 - 00:00:02] SPEAKER_00: hello and welcome\n"
+        "[00:00:02 - 00:00:04] SPEAKER_00: and welcome to the show\n"
+    )
+
+    stripped, _ = compact_transcript(transcript, strip_rolling_duplicates=True)
+    kept, _ = compact_transcript(transcript)
+
+    assert stripped == "[00:00:00 - 00:00:04] SPEAKER_00: hello and welcome to the show\n"
+    assert kept == "[00:00:00 - 00:00:04] SPEAKER_00: hello and welcome and welcome to the show\n"
+
+
+def test_rolling_duplicates_not_stripped_across_speakers():
+    transcript = (
+        "[00:00:00 - 00:00:02] SPEAKER_01: thank you\n"
+        "[00:00:02 - 00:00:04] SPEAKER_00: thank you very much\n"
+    )
+
+    compacted, _ = compact_transcript(transcript, strip_rolling_duplicates=True)
+
+    assert compacted.endswith("SPEAKER_00: thank you very much\n")
+
+
+def test_speaker_change_marker_starts_new_paragraph():
+    transcript = (
+        "[00:00:00 - 00:00:02] SPEAKER_00: how are you\n"
+        "[00:00:02 - 00:00:04] SPEAKER_00: &gt;&gt; fine thanks\n"
+        "[00:00:04 - 00:00:06] SPEAKER_00: and you? >> great\n"
+    )
+
+    compacted, _ = compact_transcript(transcript, strip_rolling_duplicates=True)
+
+    assert compacted == (
+        "[00:00:00 - 00:00:02] SPEAKER_00: how are you\n"
+        "[00:00:02 - 00:00:06] SPEAKER_00: fine thanks and you?\n"
+        "[00:00:04 - 00:00:06] SPEAKER_00: great\n"
+    )
+
+
+def test_untimestamped_transcript_is_left_alone():
+    assert compact_transcript("just some text") == ("just some text", None)
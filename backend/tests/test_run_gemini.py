@@ -0,0 +1,131 @@
+import json
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import run_gemini
+from run_gemini import GeminiClient, TokenBucket
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(run_gemini.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(run_gemini.time, "sleep", clock.sleep)
+    return clock
+
+
+def test_bucket_starts_full_and_waits_for_refill(clock):
+    bucket = TokenBucket(60)  # one unit per second
+
+    bucket.acquire(60)
+    assert clock.sleeps == []
+
+    bucket.acquire(30)
+    assert sum(clock.sleeps) == pytest.approx(30)
+
+
+def test_bucket_caps_requests_larger_than_capacity(clock):
+    bucket = TokenBucket(60)
+
+    bucket.acquire(1000)
+    assert clock.sleeps == []
+    assert bucket.tokens == 0
+
+
+def test_bucket_adjust_refunds_and_charges_debt(clock):
+    bucket = TokenBucket(60)
+    bucket.acquire(60)
+
+    bucket.adjust(-20)
+    assert bucket.tokens == pytest.approx(20)
+
+    # Charging more than is left puts the bucket in debt, the next caller waits it out
+    bucket.adjust(50)
+    assert bucket.tokens == pytest.approx(-30)
+    bucket.acquire(10)
+    assert sum(clock.sleeps) == pytest.approx(40)
+
+    # Refunds never overfill the bucket
+    bucket.adjust(-1000)
+    assert bucket.tokens == 60
+
+
+class StubGemini(BaseHTTPRequestHandler):
+    """Answers generateContent with 429 for the first `throttle` requests, then 200."""
+
+    throttle = 0
+    requests = []
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        StubGemini.requests.append((self.path, json.loads(self.rfile.read(length))))
+        if len(StubGemini.requests) <= StubGemini.throttle:
+            self.send_json(429, {"error": {"code": 429, "message": "Resource exhausted", "status": "RESOURCE_EXHAUSTED"}})
+            return
+        self.send_json(200, {
+            "candidates": [{"content": {"role": "model", "parts": [{"text": "summary"}]}, "finishReason": "STOP"}],
+            "usageMetadata": {"promptTokenCount": 40, "candidatesTokenCount": 500, "totalTokenCount": 540},
+        })
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+@pytest.fixture
+def stub_server():
+    StubGemini.requests = []
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StubGemini)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+
+
+def test_generate_retries_on_429_and_charges_reported_usage(stub_server, clock):
+    StubGemini.throttle = 1
+    client = GeminiClient("test-key", model_name="stub-model", requests_per_minute=60,
+                          tokens_per_minute=10000, max_retries=2, api_endpoint=stub_server)
+
+    assert client.generate("x" * 400) == "summary"
+
+    assert len(StubGemini.requests) == 2
+    path, body = StubGemini.requests[-1]
+    assert "stub-model:generateContent" in path
+    assert body["contents"][0]["parts"][0]["text"] == "x" * 400
+    # One backoff sleep between the 429 and the retry, which also refills the first reservation
+    assert len(clock.sleeps) == 1
+    # The retry reserved the 100 token prompt estimate and was settled at the reported 540
+    assert client.token_bucket.tokens == pytest.approx(10000 - 540)
+
+
+def test_generate_gives_up_after_max_retries(stub_server, clock):
+    StubGemini.throttle = 10
+    client = GeminiClient("test-key", model_name="stub-model", max_retries=1, api_endpoint=stub_server)
+
+    with pytest.raises(run_gemini.RETRYABLE_ERRORS):
+        client.generate("prompt")
+    assert len(StubGemini.requests) == 2
@@ -0,0 +1,144 @@
+import threading
+
+import pytest
+
+import work_queue
+from work_queue import WorkQueue, ResultCache
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(work_queue.time, "time", clock.time)
+    return clock
+
+
+@pytest.fixture
+def queue(tmp_path, clock):
+    return WorkQueue(str(tmp_path / "queue.db"), lease_seconds=60, max_attempts=2)
+
+
+def test_lease_returns_oldest_job_once(queue, clock):
+    first = queue.enqueue({"url": "a"})
+    clock.now += 1
+    queue.enqueue({"url": "b"})
+
+    assert queue.lease("w1") == (first, {"url": "a"})
+    job_id, payload = queue.lease("w2")
+    assert payload == {"url": "b"}
+    assert queue.lease("w3") is None
+
+
+def test_heartbeat_extends_lease_and_records_progress(queue, clock):
+    job_id = queue.enqueue({})
+    queue.lease("w1")
+
+    clock.now += 50
+    assert queue.heartbeat(job_id, "w1", stage="transcribing", percent=40, segments=["a", "b"])
+    clock.now += 50
+    # Without the heartbeat the lease would have expired by now
+    assert queue.lease("w2") is None
+
+    job = queue.get(job_id, since=1)
+    assert job["stage"] == "transcribing"
+    assert job["percent"] == 40
+    assert job["segments"] == ["b"]
+
+
+def test_expired_lease_is_reclaimed_and_old_worker_fenced(queue, clock):
+    job_id = queue.enqueue({})
+    queue.lease("w1")
+    queue.heartbeat(job_id, "w1", segments=["partial"])
+
+    clock.now += 61
+    assert queue.lease("w2") == (job_id, {})
+
+    job = queue.get(job_id)
+    assert job["attempts"] == 2
+    assert job["segments"] == []
+    assert not queue.heartbeat(job_id, "w1")
+    assert not queue.complete(job_id, "w1", {"from": "w1"})
+    assert queue.complete(job_id, "w2", {"from": "w2"})
+    assert queue.get(job_id)["result"] == {"from": "w2"}
+
+
+def test_job_abandoned_after_max_attempts(queue, clock):
+    job_id = queue.enqueue({})
+    queue.lease("w1")
+    clock.now += 61
+    queue.lease("w2")
+    clock.now += 61
+
+    assert queue.lease("w3") is None
+    job = queue.get(job_id)
+    assert job["status"] == "error"
+    assert "abandoned" in job["error"]
+
+
+def test_fail_records_error(queue):
+    job_id = queue.enqueue({})
+    queue.lease("w1")
+
+    assert queue.fail(job_id, "w1", "boom")
+    job = queue.get(job_id)
+    assert job["status"] == "error"
+    assert job["error"] == "boom"
+
+
+def test_purge_removes_only_old_finished_jobs(queue, clock):
+    done = queue.enqueue({})
+    queue.lease("w1")
+    queue.heartbeat(done, "w1", segments=["x"])
+    queue.complete(done, "w1", {})
+    pending = queue.enqueue({})
+
+    clock.now += 2 * 24 * 3600
+    queue.purge()
+
+    assert queue.get(done) is None
+    assert queue.get(pending)["status"] == "queued"
+
+
+def test_concurrent_workers_never_share_a_job(tmp_path):
+    queue = WorkQueue(str(tmp_path / "queue.db"))
+    for i in range(40):
+        queue.enqueue({"i": i})
+
+    leased = []
+    lock = threading.Lock()
+
+    def work(worker_id):
+        while True:
+            job = queue.lease(worker_id)
+            if job is None:
+                return
+            with lock:
+                leased.append(job[0])
+            queue.complete(job[0], worker_id, {})
+
+    threads = [threading.Thread(target=work, args=(f"w{n}",)) for n in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(leased) == 40
+    assert len(set(leased)) == 40
+
+
+def test_result_cache_round_trip(tmp_path):
+    cache = ResultCache(str(tmp_path / "cache"))
+    key = ResultCache.make_key("url", "whisper", "base", True)
+
+    assert cache.get(key) is None
+    cache.put(key, {"prompt": "p"})
+    assert cache.get(key) == {"prompt": "p"}
+    assert key != ResultCache.make_key("url", "whisper", "base", False)
@@ -0,0 +1,249 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+import hashlib
+import logging
+import tempfile
+from contextlib import closing
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id TEXT PRIMARY KEY,
+    payload TEXT NOT NULL,
+    status TEXT NOT NULL,
+    stage TEXT,
+    percent REAL NOT NULL DEFAULT 0,
+    worker_id TEXT,
+    lease_expires REAL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    result TEXT,
+    error TEXT,
+    created REAL NOT NULL,
+    updated REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS jobs_status_created ON jobs (status, created);
+CREATE TABLE IF NOT EXISTS job_segments (
+    job_id TEXT NOT NULL,
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    text TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_segments_job ON job_segments (job_id, seq);
+"""
+
+
+class WorkQueue:
+    """SQLite-backed job queue shared by the API process and worker processes.
+
+    Workers lease a job for `lease_seconds` and must heartbeat to keep it. A job
+    whose lease expired (its worker died, or stopped heartbeating because the job
+    stalled) is handed to the next worker that asks, up to `max_attempts` times.
+    Segments published by the previous attempt are dropped and `attempts` goes up.
+    Every write from a worker is fenced on its worker id, so a worker that lost its
+    lease cannot overwrite the new owner.
+
+    The database runs in WAL mode, which needs shared memory between processes, so
+    the API and all workers must run on the same host with the database on a local
+    filesystem.
+    """
+
+    def __init__(self, db_path, lease_seconds=60, max_attempts=3):
+        self.db_path = db_path
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.executescript(SCHEMA)
+
+    def _connect(self):
+        # Autocommit mode; writes that must be atomic open their own IMMEDIATE transaction
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def enqueue(self, payload):
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, payload, status, stage, created, updated) VALUES (?, ?, 'queued', 'queued', ?, ?)",
+                (job_id, json.dumps(payload), now, now),
+            )
+        logger.info(f"Enqueued job {job_id}")
+        return job_id
+
+    def lease(self, worker_id):
+        """Claim the oldest runnable job. Returns (job_id, payload) or None."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            while True:
+                row = conn.execute(
+                    "SELECT id, payload, status, worker_id, attempts FROM jobs "
+                    "WHERE status = 'queued' OR (status = 'leased' AND lease_expires < ?) "
+                    "ORDER BY created LIMIT 1",
+                    (now,),
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                if row["status"] == 'leased':
+                    logger.warning(f"Reclaiming job {row['id']} from unresponsive worker {row['worker_id']}")
+                    # The new owner starts over, drop the partial output of the old one
+                    conn.execute("DELETE FROM job_segments WHERE job_id = ?", (row["id"],))
+                    if row["attempts"] >= self.max_attempts:
+                        conn.execute(
+                            "UPDATE jobs SET status = 'error', error = ?, worker_id = NULL, updated = ? WHERE id = ?",
+                            (f"Job abandoned after {row['attempts']} attempts", now, row["id"]),
+                        )
+                        continue
+
+                conn.execute(
+                    "UPDATE jobs SET status = 'leased', stage = 'leased', percent = 0, worker_id = ?, "
+                    "lease_expires = ?, attempts = attempts + 1, updated = ? WHERE id = ?",
+                    (worker_id, now + self.lease_seconds, now, row["id"]),
+                )
+                conn.execute("COMMIT")
+                return row["id"], json.loads(row["payload"])
+        except Exception:
+            # BEGIN itself may have failed (e.g. "database is locked"), don't mask that error
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def heartbeat(self, job_id, worker_id, stage=None, percent=None, segments=()):
+        """Extend the lease and record progress. Returns False if the lease was lost."""
+        now = time.time()
+        conn = self._connect()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.execute(
+                "UPDATE jobs SET lease_expires = ?, stage = COALESCE(?, stage), percent = COALESCE(?, percent), "
+                "updated = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (now + self.lease_seconds, stage, percent, now, job_id, worker_id),
+            )
+            if cursor.rowcount == 0:
+                conn.execute("ROLLBACK")
+                return False
+            conn.executemany(
+                "INSERT INTO job_segments (job_id, text) VALUES (?, ?)",
+                [(job_id, text) for text in segments],
+            )
+            conn.execute("COMMIT")
+            return True
+        except Exception:
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        finally:
+            conn.close()
+
+    def _finish(self, job_id, worker_id, status, result=None, error=None):
+        now = time.time()
+        with closing(self._connect()) as conn:
+            cursor = conn.execute(
+                "UPDATE jobs SET status = ?, stage = ?, percent = 100, result = ?, error = ?, "
+                "lease_expires = NULL, updated = ? WHERE id = ? AND worker_id = ? AND status = 'leased'",
+                (status, status, json.dumps(result) if result is not None else None, error, now, job_id, worker_id),
+            )
+            if cursor.rowcount == 0:
+                logger.warning(f"Worker {worker_id} no longer holds job {job_id}, discarding its result")
+                return False
+            return True
+
+    def complete(self, job_id, worker_id, result):
+        return self._finish(job_id, worker_id, 'done', result=result)
+
+    def fail(self, job_id, worker_id, error):
+        return self._finish(job_id, worker_id, 'error', error=error)
+
+    def get(self, job_id, since=0):
+        """Return the job state with the segments published after the first `since`.
+
+        Pass `since=None` to skip loading segments.
+        """
+        with closing(self._connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                return None
+            segments = []
+            if since is not None:
+                segments = [r["text"] for r in conn.execute(
+                    "SELECT text FROM job_segments WHERE job_id = ? ORDER BY seq LIMIT -1 OFFSET ?",
+                    (job_id, max(0, since)),
+                )]
+        return {
+            "status": row["status"],
+            "stage": row["stage"],
+            "percent": row["percent"],
+            "worker_id": row["worker_id"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "segments": segments,
+        }
+
+    def wait(self, job_id, timeout, poll_interval=1.0):
+        """Block until the job is done or failed; returns its final state, or None on timeout."""
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            job = self.get(job_id, since=None)
+            if job and job["status"] in ('done', 'error'):
+                return job
+            time.sleep(poll_interval)
+        return None
+
+    def purge(self, older_than_seconds=24 * 3600):
+        """Delete finished jobs (and their segments) last updated before the cutoff."""
+        cutoff = time.time() - older_than_seconds
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "DELETE FROM job_segments WHERE job_id IN "
+                "(SELECT id FROM jobs WHERE status IN ('done', 'error') AND updated < ?)",
+                (cutoff,),
+            )
+            conn.execute("DELETE FROM jobs WHERE status IN ('done', 'error') AND updated < ?", (cutoff,))
+
+
+class ResultCache:
+    """Directory of JSON files shared by every API and worker process."""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def make_key(*parts):
+        return hashlib.sha256('\x1f'.join(str(p) for p in parts).encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'r', encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            logger.error(f"Error reading cache entry {key}: {e}")
+            return None
+
+    def put(self, key, value):
+        # Write to a temporary file and rename so readers never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as file:
+                json.dump(value, file)
+            os.replace(temp_path, self._path(key))
+        except Exception:
+            os.unlink(temp_path)
+            raise
@@ -0,0 +1,133 @@
+import os
+import sys
+import time
+import socket
+import logging
+import threading
+import sqlite3
+import traceback
+
+# Workers always run against the shared queue, whatever the .env says
+os.environ['DEPLOYMENT_MODE'] = 'split'
+# One log file per worker so processes on the same machine do not truncate each other's logs
+os.environ.setdefault('LOG_NAME', f"youtube_transcription_worker_{os.getpid()}")
+
+import main
+
+logger = logging.getLogger(__name__)
+
+POLL_INTERVAL = float(os.environ.get('WORKER_POLL_INTERVAL', '2'))
+# A progressive job that reports no progress for this long is considered hung and its lease is let go
+STALL_SECONDS = float(os.environ.get('JOB_STALL_SECONDS', '3600'))
+PURGE_INTERVAL = 3600
+
+
+class LeaseLost(Exception):
+    """Raised from the progress callback once another worker owns the job."""
+
+
+class Heartbeat(threading.Thread):
+    """Keeps the lease on a job alive while the (blocking) pipeline runs.
+
+    With `stall_seconds` set (progressive jobs, which report after every decoded
+    window) the lease is only extended while the pipeline keeps reporting: once
+    nothing was reported for that long the heartbeat stops, so the lease expires
+    and another worker can reclaim a job stuck in CUDA or ffmpeg. Non-progressive
+    jobs only report between stages, so they are kept alive until the process dies.
+    """
+
+    def __init__(self, queue, job_id, worker_id, interval, stall_seconds=None):
+        threading.Thread.__init__(self, daemon=True)
+        self.queue = queue
+        self.job_id = job_id
+        self.worker_id = worker_id
+        self.interval = interval
+        self.stall_seconds = stall_seconds
+        self.last_progress = time.monotonic()
+        self.lost = False
+        self.stopped = threading.Event()
+
+    def touch(self):
+        self.last_progress = time.monotonic()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if self.stall_seconds and time.monotonic() - self.last_progress > self.stall_seconds:
+                logger.error(f"Job {self.job_id} made no progress for {self.stall_seconds:.0f}s, releasing its lease")
+                return
+            try:
+                if not self.queue.heartbeat(self.job_id, self.worker_id):
+                    logger.warning(f"Lost lease on job {self.job_id}")
+                    self.lost = True
+                    return
+            except Exception as e:
+                logger.error(f"Heartbeat failed for job {self.job_id}: {e}")
+
+    def stop(self):
+        self.stopped.set()
+
+
+def process_job(queue, cache, job_id, params, worker_id):
+    logger.info(f"Worker {worker_id} processing job {job_id} for {params['url']}")
+
+    stall_seconds = STALL_SECONDS if params.get('progressive') else None
+    heartbeat = Heartbeat(queue, job_id, worker_id, max(1, queue.lease_seconds / 3), stall_seconds)
+
+    def report(stage, percent=None, segments=()):
+        heartbeat.touch()
+        try:
+            if not queue.heartbeat(job_id, worker_id, stage=stage, percent=percent, segments=segments):
+                heartbeat.lost = True
+        except sqlite3.Error as e:
+            logger.error(f"Could not record progress for job {job_id}: {e}")
+        # Stop working on a job another worker has taken over
+        if heartbeat.lost:
+            raise LeaseLost(job_id)
+
+    heartbeat.start()
+    try:
+        payload, status_code = main.run_pipeline(params, report)
+        if status_code == 200:
+            cache.put(main.make_cache_key(params), {"url": params['url'], "prompt": payload['prompt']})
+        queue.complete(job_id, worker_id, {"payload": payload, "status_code": status_code})
+    except LeaseLost:
+        logger.warning(f"Worker {worker_id} abandoned job {job_id} after losing its lease")
+    except Exception as e:
+        logger.error(f"Error processing job {job_id}: {e}")
+        traceback.print_exc()
+        queue.fail(job_id, worker_id, str(e))
+    finally:
+        heartbeat.stop()
+
+
+def run_worker():
+    worker_id = f"{socket.gethostname()}-{os.getpid()}"
+    queue = main.work_queue
+    cache = main.result_cache
+    main.load_models(main.whisper_model_name)
+    logger.info(f"Worker {worker_id} started, queue at {queue.db_path}")
+
+    last_purge = 0
+    while True:
+        try:
+            if time.monotonic() - last_purge > PURGE_INTERVAL:
+                queue.purge()
+                last_purge = time.monotonic()
+            leased = queue.lease(worker_id)
+        except sqlite3.Error as e:
+            # A busy or briefly unavailable database must not take the worker down
+            logger.error(f"Work queue error, retrying: {e}")
+            leased = None
+        if leased is None:
+            time.sleep(POLL_INTERVAL)
+            continue
+        job_id, params = leased
+        process_job(queue, cache, job_id, params, worker_id)
+
+
+if __name__ == '__main__':
+    try:
+        run_worker()
+    except KeyboardInterrupt:
+        logger.info("Worker stopped")
+        sys.exit(0)